@@ -1,14 +1,19 @@
 import ast
+import hashlib
+import mmap
 import os
-import pickle
+import struct
+import sys
 from sys import argv
 
-import osmnx as ox
+import numpy as np
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 RAW_DATA_DIR = os.path.join(BASE_DIR, '../data/raw')
 PROCESSED_DATA_DIR = os.path.join(BASE_DIR, '../data/processed')
 OUTPUT_FILENAME = 'jakarta_network_processed.pkl'
+BUFFER_SIDECAR_SUFFIX = '.bin'
+BUFFER_SIDECAR_MAGIC = b'GPBUF002'
 
 # Simplified emitted particulate mass factors for one representative vehicle.
 # These values are for route comparison, not ambient air-concentration claims.
@@ -48,6 +53,26 @@ speed_limits_kmh = {
     'default': 30,
 }
 
+# OSMnx attributes the app never reads; dropped before pickling to shrink the graph.
+UNUSED_EDGE_ATTRIBUTES = (
+    'geometry', 'name', 'osmid', 'ref', 'maxspeed', 'oneway', 'reversed', 'bridge',
+    'tunnel', 'junction', 'access', 'lanes', 'service', 'width',
+)
+NODE_ATTRIBUTES = ('x', 'y')
+
+# Fused per-road parameters: (PM2.5 mg per metre, traffic multiplier, seconds per metre).
+# Dense road-type codes index rows of the same table so edge weights are array lookups.
+ROAD_PARAMS = {
+    road: (
+        factor['base_pm25_mg_per_km'] * factor['traffic_multiplier'] / 1000,
+        factor['traffic_multiplier'],
+        3.6 / speed_limits_kmh[road],
+    )
+    for road, factor in PM25_FACTORS.items()
+}
+ROAD_TYPES = tuple(ROAD_PARAMS)
+ROAD_CODES = {road_type: code for code, road_type in enumerate(ROAD_TYPES)}
+
 
 def normalize_highway(highway):
     if isinstance(highway, list):
@@ -62,68 +87,211 @@ def normalize_highway(highway):
     return highway or 'default'
 
 
+def encode_road_types(highways):
+    """Map highway tags to small integer codes; unlisted tags get their own code with default factors."""
+    road_types = list(ROAD_TYPES)
+    road_codes = dict(ROAD_CODES)
+    codes = []
+    for highway in highways:
+        code = road_codes.get(highway)
+        if code is None:
+            code = road_codes[highway] = len(road_types)
+            road_types.append(highway)
+        codes.append(code)
+    dtype = np.uint8 if len(road_types) <= 256 else np.uint16
+    return np.array(codes, dtype=dtype), tuple(road_types)
+
+
+def compute_edge_weights_numpy(lengths, codes, at_junction, pm25_table, seconds_table, time_out, pm25_out, pm10_out):
+    pm25_mg = lengths * pm25_table[codes] * np.where(at_junction, 1.15, 1.0)
+    time_out[:] = lengths * seconds_table[codes]
+    pm25_out[:] = pm25_mg
+    pm10_out[:] = pm25_mg * 2.5
+
+
+_EDGE_WEIGHT_KERNEL = None
+
+
+def edge_weight_kernel():
+    """Return the edge-weight loop, compiled with numba when it is installed."""
+    global _EDGE_WEIGHT_KERNEL
+    if _EDGE_WEIGHT_KERNEL is not None:
+        return _EDGE_WEIGHT_KERNEL
+
+    # numba takes ~0.3 s to import; load it only once there is a graph to weight.
+    try:
+        from numba import njit, prange
+    except ImportError:
+        _EDGE_WEIGHT_KERNEL = compute_edge_weights_numpy
+        return _EDGE_WEIGHT_KERNEL
+
+    @njit(parallel=True, cache=True)
+    def compute_edge_weights(lengths, codes, at_junction, pm25_table, seconds_table, time_out, pm25_out, pm10_out):
+        for i in prange(lengths.size):
+            stop_go_multiplier = 1.15 if at_junction[i] else 1.0
+            pm25_mg = lengths[i] * pm25_table[codes[i]] * stop_go_multiplier
+            time_out[i] = lengths[i] * seconds_table[codes[i]]
+            pm25_out[i] = pm25_mg
+            pm10_out[i] = pm25_mg * 2.5
+
+    _EDGE_WEIGHT_KERNEL = compute_edge_weights
+    return _EDGE_WEIGHT_KERNEL
+
+
 def add_pollution_weights(G):
-    """Add time, PM2.5, and PM10 weights to each edge in the graph."""
+    """Add time, PM2.5, and PM10 weights as edge-indexed arrays on the graph."""
     print("\tAdding PM2.5/PM10 route weights to network...")
-    edges_processed = 0
+    edges = list(G.edges(keys=True, data=True))
+    edge_count = len(edges)
+    degree = dict(G.degree())
 
-    for u, v, key, data in G.edges(keys=True, data=True):
-        highway = normalize_highway(data.get('highway', 'default'))
-        length = float(data.get('length', 100))
-        length_km = length / 1000
-        factor = PM25_FACTORS.get(highway, PM25_FACTORS['default'])
-        stop_go_multiplier = 1.15 if G.degree(u) > 2 or G.degree(v) > 2 else 1.0
+    codes, road_types = encode_road_types(
+        normalize_highway(data.get('highway', 'default')) for _, _, _, data in edges
+    )
+    param_table = np.array(
+        [ROAD_PARAMS.get(road_type, ROAD_PARAMS['default']) for road_type in road_types],
+        dtype=np.float64,
+    )
+    lengths = np.fromiter(
+        (float(data.get('length', 100)) for _, _, _, data in edges),
+        dtype=np.float64, count=edge_count,
+    )
+    at_junction = np.fromiter(
+        (degree[u] > 2 or degree[v] > 2 for u, v, _, _ in edges),
+        dtype=np.bool_, count=edge_count,
+    )
+
+    time_seconds = np.empty(edge_count, dtype=np.float32)
+    pm25_mg = np.empty(edge_count, dtype=np.float32)
+    pm10_mg = np.empty(edge_count, dtype=np.float32)
+    edge_weight_kernel()(
+        lengths, codes, at_junction,
+        np.ascontiguousarray(param_table[:, 0]), np.ascontiguousarray(param_table[:, 2]),
+        time_seconds, pm25_mg, pm10_mg,
+    )
 
-        pm25_mg = (
-            length_km
-            * factor['base_pm25_mg_per_km']
-            * factor['traffic_multiplier']
-            * stop_go_multiplier
-        )
-        pm10_mg = pm25_mg * 2.5
+    for eid, (_, _, _, data) in enumerate(edges):
+        data['eid'] = eid
+        # Interned tags pickle as one memoized string instead of one copy per edge.
+        if isinstance(data.get('highway'), str):
+            data['highway'] = sys.intern(data['highway'])
 
-        G[u][v][key]['pm25_mg'] = pm25_mg
-        G[u][v][key]['pm10_mg'] = pm10_mg
-        G[u][v][key]['pollution'] = pm25_mg
-        G[u][v][key]['pollution_multiplier'] = factor['traffic_multiplier'] * stop_go_multiplier
-        G[u][v][key]['pollution_unit'] = 'mg'
-        G[u][v][key]['road_type'] = highway
+    # Numeric weights live in float32 arrays indexed by each edge's 'eid'. They are
+    # pickled out-of-band into the buffer sidecar instead of as per-edge floats.
+    G.graph['edge_weights'] = {
+        'time': time_seconds,
+        'pm25_mg': pm25_mg,
+        'pollution': pm25_mg,
+        'pm10_mg': pm10_mg,
+    }
+    # Road types are stored once per graph; each edge's code indexes the name table.
+    G.graph['edge_road_codes'] = codes
+    G.graph['road_types'] = road_types
+    G.graph['pollution_unit'] = 'mg'
+
+    print(f"Processed {edge_count} edges")
+    return G
 
-        road_speed = speed_limits_kmh.get(highway, speed_limits_kmh['default'])
-        G[u][v][key]['time'] = (length / 1000) / road_speed * 3600
 
-        edges_processed += 1
+def strip_unused_attributes(G):
+    """Drop OSM edge tags and node attributes that routing and the API do not use."""
+    for _, _, data in G.edges(data=True):
+        for attribute in UNUSED_EDGE_ATTRIBUTES:
+            data.pop(attribute, None)
 
-    print(f"Processed {edges_processed} edges")
+    for _, data in G.nodes(data=True):
+        for attribute in [name for name in data if name not in NODE_ATTRIBUTES]:
+            del data[attribute]
     return G
 
 
 def save_processed_network(G):
-    """Save the processed network with route weights."""
+    """Save the processed network with route weights.
+
+    The graph is pickled with protocol 5+ so large array buffers are written
+    out-of-band into a page-aligned ``.bin`` sidecar that the app can mmap.
+    """
+    import pickle
+
     print("\nSaving processed network...")
     os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
     full_processed_path = os.path.join(PROCESSED_DATA_DIR, OUTPUT_FILENAME)
-    with open(full_processed_path, 'wb') as f:
-        pickle.dump(G, f)
+    sidecar_path = os.path.splitext(full_processed_path)[0] + BUFFER_SIDECAR_SUFFIX
+
+    buffers = []
+    pickled = pickle.dumps(G, protocol=pickle.HIGHEST_PROTOCOL, buffer_callback=buffers.append)
+
+    # Each file is written beside its target and renamed into place, so an interrupted save
+    # never leaves a partial file. The sidecar records its pickle's length and digest, so a
+    # sidecar from another save is rejected at load instead of being paired with this pickle.
+    if buffers:
+        write_buffer_sidecar(sidecar_path, buffers, pickled)
+        print(f"Saved {len(buffers)} out-of-band buffers to: {sidecar_path}")
+    elif os.path.exists(sidecar_path):
+        os.remove(sidecar_path)
+
+    temp_path = full_processed_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(pickled)
+    os.replace(temp_path, full_processed_path)
     print(f"Saved to: {full_processed_path}")
 
 
+def pickle_stream_digest(pickled):
+    return hashlib.blake2b(pickled, digest_size=16).digest()
+
+
+def write_buffer_sidecar(path, buffers, pickled):
+    """Write pickle buffers page-aligned after a header naming their pickle and an (offset, length) index."""
+    raws = [buffer.raw() for buffer in buffers]
+    header_size = len(BUFFER_SIDECAR_MAGIC) + 8 + 8 + 16 + 16 * len(raws)
+
+    offsets = []
+    offset = align_to_page(header_size)
+    for raw in raws:
+        offsets.append(offset)
+        offset = align_to_page(offset + raw.nbytes)
+
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(BUFFER_SIDECAR_MAGIC)
+        f.write(struct.pack('<QQ', len(raws), len(pickled)))
+        f.write(pickle_stream_digest(pickled))
+        for buffer_offset, raw in zip(offsets, raws):
+            f.write(struct.pack('<QQ', buffer_offset, raw.nbytes))
+        for buffer_offset, raw in zip(offsets, raws):
+            f.seek(buffer_offset)
+            f.write(raw)
+    os.replace(temp_path, path)
+
+
+def align_to_page(offset):
+    return -(-offset // mmap.PAGESIZE) * mmap.PAGESIZE
+
+
 def display_sample_edges(G, n=5):
     """Display sample edges with their weights."""
     print(f"\nSample edges with weights (first {n}):")
     print("-" * 80)
 
+    weights = G.graph['edge_weights']
+    road_codes = G.graph['edge_road_codes']
+    road_types = G.graph['road_types']
     for i, (u, v, key, data) in enumerate(G.edges(keys=True, data=True)):
         if i >= n:
             break
 
+        eid = data['eid']
+        road_type = road_types[road_codes[eid]]
+        traffic_multiplier = ROAD_PARAMS.get(road_type, ROAD_PARAMS['default'])[1]
+        stop_go_multiplier = 1.15 if G.degree(u) > 2 or G.degree(v) > 2 else 1.0
         print(f"\n\tEdge {i + 1}:")
-        print(f"\tRoad type: {data.get('road_type', 'unknown')}")
+        print(f"\tRoad type: {road_type}")
         print(f"\tLength: {data.get('length', 0):.2f}m")
-        print(f"\tTime: {data.get('time', 0):.2f}s")
-        print(f"\tPM2.5: {data.get('pm25_mg', data.get('pollution', 0)):.2f} mg")
-        print(f"\tPM10: {data.get('pm10_mg', 0):.2f} mg")
-        print(f"\tPollution multiplier: {data.get('pollution_multiplier', 0):.2f}x")
+        print(f"\tTime: {weights['time'][eid]:.2f}s")
+        print(f"\tPM2.5: {weights['pm25_mg'][eid]:.2f} mg")
+        print(f"\tPM10: {weights['pm10_mg'][eid]:.2f} mg")
+        print(f"\tPollution multiplier: {traffic_multiplier * stop_go_multiplier:.2f}x")
 
 
 def resolve_size_key(args):
@@ -148,6 +316,9 @@ def resolve_size_key(args):
 
 if __name__ == "__main__":
     size_key = resolve_size_key(argv)
+    # OSMnx pulls in geopandas/shapely; import it only once the mode is settled.
+    import osmnx as ox
+
     filename = f'jakarta_network_{size_key}.graphml'
     full_raw_path = os.path.join(RAW_DATA_DIR, filename)
 
@@ -159,6 +330,7 @@ if __name__ == "__main__":
 
         G = add_pollution_weights(G)
         display_sample_edges(G)
+        strip_unused_attributes(G)
         save_processed_network(G)
 
         print("\n\t" + "=" * 16)
@@ -1,25 +1,51 @@
 import ast
+import gc
+import json
+import math
 import os
-import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import chain
 
-import osmnx as ox
-from flask import Flask, abort, jsonify, request, send_from_directory
+import numpy as np
+from flask import Flask, abort, jsonify, request, send_from_directory, stream_with_context
 from flask_cors import CORS
+from scipy.spatial import cKDTree
 
-from pathfinding_algo import astar_pathfinding, calculate_route_stats
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from pathfinding_algo import astar_pathfinding, calculate_route_stats, graph_csr, load_processed_graph
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 WEB_DIR = os.path.join(BASE_DIR, '../web')
 PROCESSED_DATA_DIR = os.path.join(BASE_DIR, '../data/processed')
 INPUT_FILENAME = os.getenv('GREENPATH_GRAPH_FILE', 'jakarta_network_processed.pkl')
+PRELOAD_GRAPH = os.getenv('GREENPATH_PRELOAD_GRAPH', '0') == '1'
+# Each cached route keeps its explored node/edge coordinates: up to ~8 MB for a city-wide route.
+ROUTE_CACHE_SIZE = int(os.getenv('GREENPATH_ROUTE_CACHE_SIZE', '8'))
 APP_AREA_NAME = 'Greater Jakarta'
 
 app = Flask(__name__)
 CORS(app)
 
+# The fastest and greenest searches are independent, so each request runs them side by side.
+ROUTE_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix='astar')
+
 G = None
+GRAPH_LOAD_LOCK = threading.Lock()
 GRAPH_LOAD_ERROR = None
 MAP_CONTEXT = None
+NODE_IDS = None
+NODE_POSITIONS = None
+NODE_LATLON = None
+NODE_TREE = None
+NODE_LON_SCALE = 1.0
+NEAREST_NODE_DECIMALS = 5
+EXPLORED_EDGE_BATCH = 512
 
 PM25_FACTORS = {
     'motorway': {'base_pm25_mg_per_km': 6, 'traffic_multiplier': 1.8},
@@ -39,6 +65,16 @@ PM25_FACTORS = {
     'default': {'base_pm25_mg_per_km': 16, 'traffic_multiplier': 1.0},
 }
 
+# PM2.5 mg per metre for each road type, with traffic already applied.
+ROAD_PM25_MG_PER_M = {
+    road: factor['base_pm25_mg_per_km'] * factor['traffic_multiplier'] / 1000
+    for road, factor in PM25_FACTORS.items()
+}
+ROAD_TYPES = tuple(ROAD_PM25_MG_PER_M)
+ROAD_CODES = {road_type: code for code, road_type in enumerate(ROAD_TYPES)}
+
+LEGACY_EDGE_KEYS = ('pm25_mg', 'pm10_mg', 'pollution', 'pollution_multiplier', 'pollution_unit', 'road_type', 'time')
+
 POLLUTION_UNIT = 'mg'
 POLLUTION_UNIT_LABEL = 'Estimated emitted particulate mass'
 
@@ -46,32 +82,49 @@ POLLUTION_UNIT_LABEL = 'Estimated emitted particulate mass'
 def get_graph():
     """Load the processed graph once and return JSON-friendly errors if missing."""
     global G, GRAPH_LOAD_ERROR, MAP_CONTEXT
+    global NODE_IDS, NODE_POSITIONS, NODE_LATLON, NODE_TREE, NODE_LON_SCALE
 
     if G is not None:
         return G
 
-    graph_path = os.path.join(PROCESSED_DATA_DIR, INPUT_FILENAME)
-    if not os.path.exists(graph_path):
-        GRAPH_LOAD_ERROR = (
-            f"Processed graph not found: {graph_path}. "
-            "Run scripts/add_pollution_weights.py large after generating jakarta_network_large.graphml."
-        )
-        return None
+    # One thread loads; the others wait and then see the finished graph.
+    with GRAPH_LOAD_LOCK:
+        if G is not None:
+            return G
 
-    try:
-        print(f"Loading {APP_AREA_NAME} network graph from {graph_path}...")
-        with open(graph_path, 'rb') as f:
-            G = pickle.load(f)
-        apply_runtime_pollution_model(G)
-        MAP_CONTEXT = build_map_context(G)
+        graph_path = os.path.join(PROCESSED_DATA_DIR, INPUT_FILENAME)
+        try:
+            graph_size_mb = os.stat(graph_path).st_size / 1048576
+        except FileNotFoundError:
+            GRAPH_LOAD_ERROR = (
+                f"Processed graph not found: {graph_path}. "
+                "Run scripts/add_pollution_weights.py large after generating jakarta_network_large.graphml."
+            )
+            return None
+
+        try:
+            print(f"Loading {APP_AREA_NAME} network graph from {graph_path} ({graph_size_mb:.1f} MB)...")
+            graph = load_processed_graph(graph_path)
+            apply_runtime_pollution_model(graph)
+            map_context = build_map_context(graph)
+            node_index = build_node_index(graph)
+            # A trivial search compiles the search and resolves its weights before the first request.
+            first_node = node_index[0][0].item()
+            for weight in ('time', 'pollution'):
+                astar_pathfinding(graph, first_node, first_node, weight=weight)
+        except Exception as exc:
+            GRAPH_LOAD_ERROR = f"Failed to load processed graph: {exc}"
+            return None
+
+        # Publish G last: callers that see it non-None rely on everything else being ready.
+        MAP_CONTEXT = map_context
+        NODE_IDS, NODE_POSITIONS, NODE_LATLON, NODE_TREE, NODE_LON_SCALE = node_index
+        cached_nearest_node.cache_clear()
+        cached_route_payload.cache_clear()
         GRAPH_LOAD_ERROR = None
+        G = graph
         print("Network loaded!")
         return G
-    except Exception as exc:
-        GRAPH_LOAD_ERROR = f"Failed to load processed graph: {exc}"
-        G = None
-        MAP_CONTEXT = None
-        return None
 
 
 def normalize_highway(highway):
@@ -87,33 +140,117 @@ def normalize_highway(highway):
     return highway or 'default'
 
 
+def encode_road_types(highways):
+    """Map highway tags to small integer codes; unlisted tags get their own code with default factors."""
+    road_types = list(ROAD_TYPES)
+    road_codes = dict(ROAD_CODES)
+    codes = []
+    for highway in highways:
+        code = road_codes.get(highway)
+        if code is None:
+            code = road_codes[highway] = len(road_types)
+            road_types.append(highway)
+        codes.append(code)
+    dtype = np.uint8 if len(road_types) <= 256 else np.uint16
+    return np.array(codes, dtype=dtype), tuple(road_types)
+
+
 def apply_runtime_pollution_model(graph):
-    """Keep old processed files compatible by applying the PM model at load time."""
-    for u, v, key, data in graph.edges(keys=True, data=True):
-        highway = normalize_highway(data.get('highway', data.get('road_type', 'default')))
+    """Keep old processed files compatible by applying the PM model at load time.
+
+    Older files store weights as per-edge dict entries; they are moved into the same
+    edge-indexed float32 arrays that add_pollution_weights.py now writes.
+    """
+    if 'edge_weights' in graph.graph:
+        return
+
+    degree = dict(graph.degree())
+    highways = []
+    lengths = []
+    at_junction = []
+    times = []
+    for eid, (u, v, key, data) in enumerate(graph.edges(keys=True, data=True)):
         length = float(data.get('length', 100))
-        length_km = length / 1000
-        factor = PM25_FACTORS.get(highway, PM25_FACTORS['default'])
-        stop_go_multiplier = 1.15 if graph.degree(u) > 2 or graph.degree(v) > 2 else 1.0
 
-        pm25_mg = (
-            length_km
-            * factor['base_pm25_mg_per_km']
-            * factor['traffic_multiplier']
-            * stop_go_multiplier
-        )
-        pm10_mg = pm25_mg * 2.5
+        highways.append(normalize_highway(data.get('highway', data.get('road_type', 'default'))))
+        lengths.append(length)
+        at_junction.append(degree[u] > 2 or degree[v] > 2)
+        times.append(data.get('time', length))
+
+        for legacy_key in LEGACY_EDGE_KEYS:
+            data.pop(legacy_key, None)
+        data['eid'] = eid
+
+    codes, road_types = encode_road_types(highways)
+    pm25_table = np.array(
+        [ROAD_PM25_MG_PER_M.get(road_type, ROAD_PM25_MG_PER_M['default']) for road_type in road_types],
+        dtype=np.float64,
+    )
+    stop_go_multiplier = np.where(at_junction, 1.15, 1.0)
+    pm25_mg = (np.array(lengths, dtype=np.float64) * pm25_table[codes] * stop_go_multiplier).astype(np.float32)
+
+    graph.graph['edge_weights'] = {
+        'time': np.array(times, dtype=np.float32),
+        'pm25_mg': pm25_mg,
+        'pollution': pm25_mg,
+        'pm10_mg': pm25_mg * np.float32(2.5),
+    }
+    graph.graph['edge_road_codes'] = codes
+    graph.graph['road_types'] = road_types
+    graph.graph['pollution_unit'] = POLLUTION_UNIT
+
+
+def build_node_index(graph):
+    """Index node coordinates once for nearest-node snapping and path conversion."""
+    # The search's CSR snapshot already holds the node order, positions and coordinates.
+    csr = graph_csr(graph)
+    node_ids = np.fromiter(csr['nodes'], dtype=np.int64, count=len(csr['nodes']))
+    positions = csr['index']
+    latlon = np.column_stack((csr['lat'], csr['lon']))
+
+    # Scale longitude so tree distances approximate metres at this latitude.
+    lon_scale = math.cos(math.radians(float(latlon[:, 0].mean())))
+    tree = cKDTree(np.column_stack((latlon[:, 1] * lon_scale, latlon[:, 0])))
+    return node_ids, positions, latlon, tree, lon_scale
+
 
-        data['pm25_mg'] = pm25_mg
-        data['pm10_mg'] = pm10_mg
-        data['pollution'] = pm25_mg
-        data['pollution_multiplier'] = factor['traffic_multiplier'] * stop_go_multiplier
-        data['pollution_unit'] = POLLUTION_UNIT
-        data['road_type'] = highway
+@lru_cache(maxsize=4096)
+def cached_nearest_node(lon, lat):
+    _, index = NODE_TREE.query((lon * NODE_LON_SCALE, lat))
+    return int(NODE_IDS[index])
 
 
-def path_to_coords(graph, path):
-    return [[graph.nodes[node]['y'], graph.nodes[node]['x']] for node in path]
+def nearest_node(lon, lat):
+    return cached_nearest_node(round(lon, NEAREST_NODE_DECIMALS), round(lat, NEAREST_NODE_DECIMALS))
+
+
+def node_indices(nodes):
+    return np.fromiter((NODE_POSITIONS[node] for node in nodes), dtype=np.intp, count=len(nodes))
+
+
+def path_to_coords(path):
+    return NODE_LATLON[node_indices(path)]
+
+
+def edges_to_coords(edges):
+    endpoints = np.fromiter(
+        (NODE_POSITIONS[node] for node in chain.from_iterable(edges)),
+        dtype=np.intp, count=2 * len(edges),
+    )
+    return NODE_LATLON[endpoints].reshape(-1, 2, 2)
+
+
+def encode_json(payload):
+    """Encode a response payload; orjson serializes the coordinate arrays without tolist()."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, separators=(',', ':'), default=array_to_list).encode('utf-8')
+
+
+def array_to_list(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
 
 
 def build_map_context(graph, max_lines=1400):
@@ -229,6 +366,7 @@ def health():
         'graph_file': INPUT_FILENAME,
         'nodes': len(graph.nodes()) if graph else 0,
         'edges': len(graph.edges()) if graph else 0,
+        'route_cache': cached_route_payload.cache_info()._asdict(),
         'error': GRAPH_LOAD_ERROR,
     }), 200 if is_ready else 503
 
@@ -244,6 +382,58 @@ def map_context():
     return jsonify(MAP_CONTEXT)
 
 
+@lru_cache(maxsize=ROUTE_CACHE_SIZE)
+def cached_route_payload(start_node, end_node):
+    """Run both searches for a snapped node pair and return the response payload, or None if unreachable."""
+    time_search = ROUTE_EXECUTOR.submit(astar_pathfinding, G, start_node, end_node, weight='time')
+    poll_search = ROUTE_EXECUTOR.submit(astar_pathfinding, G, start_node, end_node, weight='pollution')
+    time_route, _, time_explored, time_edges = time_search.result()
+    poll_route, _, poll_explored, poll_edges = poll_search.result()
+
+    if not time_route or not poll_route:
+        return None
+
+    time_stats = calculate_route_stats(G, time_route, "Fastest Route")
+    poll_stats = calculate_route_stats(G, poll_route, "Greenest Route")
+
+    response = {
+        'time_route': {
+            'path': path_to_coords(time_route),
+            'stats': time_stats,
+            'explored': path_to_coords(time_explored),
+            'explored_edges': edges_to_coords(time_edges),
+        },
+        'pollution_route': {
+            'path': path_to_coords(poll_route),
+            'stats': poll_stats,
+            'explored': path_to_coords(poll_explored),
+            'explored_edges': edges_to_coords(poll_edges),
+        },
+        'pollution_unit': POLLUTION_UNIT,
+        'pollution_unit_label': POLLUTION_UNIT_LABEL,
+        'pollution_note': 'PM estimates are simplified emitted particulate mass for one representative vehicle, not ambient concentration.',
+    }
+
+    return response
+
+
+def iter_route_json(payload):
+    """Yield the route response as JSON chunks, encoding explored edges in batches as they stream."""
+    for prefix, key in ((b'{"time_route":', 'time_route'), (b',"pollution_route":', 'pollution_route')):
+        route = payload[key]
+        head = {name: route[name] for name in ('path', 'stats', 'explored')}
+        yield prefix + encode_json(head)[:-1] + b',"explored_edges":['
+
+        edges = route['explored_edges']
+        for offset in range(0, len(edges), EXPLORED_EDGE_BATCH):
+            batch = encode_json(edges[offset:offset + EXPLORED_EDGE_BATCH])[1:-1]
+            yield batch if offset == 0 else b',' + batch
+        yield b']}'
+
+    meta = {name: payload[name] for name in ('pollution_unit', 'pollution_unit_label', 'pollution_note')}
+    yield b',' + encode_json(meta)[1:]
+
+
 @app.route('/api/route', methods=['GET'])
 @app.route('/get_route', methods=['GET'])
 def get_route():
@@ -262,37 +452,13 @@ def get_route():
     except (TypeError, ValueError):
         return jsonify({'error': 'Invalid coordinates'}), 400
 
-    start_node = ox.nearest_nodes(graph, start_lon, start_lat)
-    end_node = ox.nearest_nodes(graph, end_lon, end_lat)
+    start_node = nearest_node(start_lon, start_lat)
+    end_node = nearest_node(end_lon, end_lat)
 
-    time_route, _, time_explored, time_edges = astar_pathfinding(graph, start_node, end_node, weight='time')
-    poll_route, _, poll_explored, poll_edges = astar_pathfinding(graph, start_node, end_node, weight='pollution')
-
-    if not time_route or not poll_route:
+    payload = cached_route_payload(start_node, end_node)
+    if payload is None:
         return jsonify({'error': 'No route found'}), 404
-
-    time_stats = calculate_route_stats(graph, time_route, "Fastest Route")
-    poll_stats = calculate_route_stats(graph, poll_route, "Greenest Route")
-
-    response = {
-        'time_route': {
-            'path': path_to_coords(graph, time_route),
-            'stats': time_stats,
-            'explored': path_to_coords(graph, time_explored),
-            'explored_edges': [[path_to_coords(graph, [u])[0], path_to_coords(graph, [v])[0]] for u, v in time_edges],
-        },
-        'pollution_route': {
-            'path': path_to_coords(graph, poll_route),
-            'stats': poll_stats,
-            'explored': path_to_coords(graph, poll_explored),
-            'explored_edges': [[path_to_coords(graph, [u])[0], path_to_coords(graph, [v])[0]] for u, v in poll_edges],
-        },
-        'pollution_unit': POLLUTION_UNIT,
-        'pollution_unit_label': POLLUTION_UNIT_LABEL,
-        'pollution_note': 'PM estimates are simplified emitted particulate mass for one representative vehicle, not ambient concentration.',
-    }
-
-    return jsonify(response)
+    return app.response_class(stream_with_context(iter_route_json(payload)), mimetype='application/json')
 
 
 @app.route('/')
@@ -312,10 +478,21 @@ def web_static(filename):
     return send_from_directory(WEB_DIR, filename)
 
 
-if __name__ == '__main__':
+if PRELOAD_GRAPH:
+    # Load in the gunicorn master before it forks so workers share the graph copy-on-write.
+    get_graph()
+    gc.freeze()
+
+
+def main():
+    """Run the development server in this process; launchers can import and call it."""
     port = int(os.getenv('PORT', '5000'))
     print(f"Server running on http://localhost:{port}/")
     print(f"  Landing: http://localhost:{port}/")
     print(f"  Map app: http://localhost:{port}/app")
     print(f"  Health: http://localhost:{port}/api/health")
-    app.run(debug=False, host='0.0.0.0', port=port)
+    app.run(debug=False, host='0.0.0.0', port=port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,118 +1,622 @@
 import pickle
+import hashlib
 import json
+from functools import lru_cache
 from heapq import heappush, heappop
 import math
+import mmap
 import os
+import struct
+import weakref
+
+import numpy as np
+
+# GREENPATH_JIT=0 runs the pure-Python search, for one-off runs where loading the compiled
+# kernels (about a second per process, even from numba's on-disk cache) outweighs the routing.
+if os.getenv('GREENPATH_JIT', '1') != '1':
+    njit = None
+else:
+    try:
+        from numba import njit
+    except ImportError:
+        njit = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROCESSED_DATA_DIR = os.path.join(BASE_DIR, '../data/processed')
 INPUT_FILENAME = 'jakarta_network_processed.pkl'
+BUFFER_SIDECAR_SUFFIX = '.bin'
+BUFFER_SIDECAR_MAGIC = b'GPBUF002'
+
+def load_processed_graph(graph_path):
+    """Unpickle a processed graph, memory-mapping its out-of-band buffers if present."""
+    graph_entry, sidecar_entry = locate_processed_files(graph_path)
+    if graph_entry is None:
+        raise FileNotFoundError(f"Processed graph not found: {graph_path}")
+
+    with open(graph_entry.path, 'rb') as f:
+        advise_sequential_read(f)
+        if sidecar_entry is None:
+            return pickle.load(f)
+        pickled = f.read()
+    return pickle.loads(pickled, buffers=read_buffer_sidecar(sidecar_entry.path, pickled))
+
+def advise_sequential_read(f):
+    """Hint the OS to prefetch the whole file; pickle then reads it front to back."""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+
+def locate_processed_files(graph_path):
+    """Find the processed graph and its buffer sidecar with a single directory scan."""
+    directory, filename = os.path.split(graph_path)
+    sidecar_name = os.path.splitext(filename)[0] + BUFFER_SIDECAR_SUFFIX
+    found = {}
+    try:
+        with os.scandir(directory or '.') as entries:
+            for entry in entries:
+                if entry.name in (filename, sidecar_name) and entry.is_file():
+                    found[entry.name] = entry
+    except FileNotFoundError:
+        pass
+    return found.get(filename), found.get(sidecar_name)
+
+def read_buffer_sidecar(path, pickled):
+    """Map a sidecar written by add_pollution_weights.py for the pickle bytes `pickled`
+    and slice out each buffer; raises ValueError if it belongs to a different pickle."""
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mmap, 'MADV_WILLNEED'):
+        mapped.madvise(mmap.MADV_WILLNEED)
+
+    if mapped[:len(BUFFER_SIDECAR_MAGIC)] != BUFFER_SIDECAR_MAGIC:
+        raise ValueError(f"Not a GreenPath buffer sidecar (or an older format; reprocess the graph): {path}")
+
+    header_offset = len(BUFFER_SIDECAR_MAGIC)
+    count, pickle_length = struct.unpack_from('<QQ', mapped, header_offset)
+    digest = mapped[header_offset + 16:header_offset + 32]
+    if pickle_length != len(pickled) or digest != hashlib.blake2b(pickled, digest_size=16).digest():
+        raise ValueError(f"Buffer sidecar {path} was written for a different pickle; reprocess the graph")
+
+    view = memoryview(mapped)
+    index_offset = header_offset + 32
+    buffers = []
+    for index in range(count):
+        offset, length = struct.unpack_from('<QQ', mapped, index_offset + 16 * index)
+        if offset + length > len(mapped):
+            raise ValueError(f"Buffer sidecar is truncated: {path}")
+        buffers.append(view[offset:offset + length])
+    return buffers
+
+EARTH_RADIUS_M = 6371000
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
 
 def haversine_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points (heuristic for A*)"""
-    R = 6371000  # Earth radius in meters
+    """Calculate great-circle distance between two points in meters"""
     phi1, phi2 = math.radians(lat1), math.radians(lat2)
     dphi = math.radians(lat2 - lat1)
     dlambda = math.radians(lon2 - lon1)
     
     a = math.sin(dphi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda/2)**2
-    return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+MAX_SPEED_MPS = 80 / 3.6  # 80 km/h converted to meters/second (~22.2)
+MIN_PM25_MG_PER_KM = 6 * 1.8  # motorway base factor * traffic multiplier
+
+def heuristic_scale(weight):
+    """Factor turning straight-line metres into a lower bound on `weight`."""
+    if weight == 'time':
+        # Time = Distance / MaxSpeed
+        return 1 / MAX_SPEED_MPS
+    if weight == 'pollution':
+        # PM2.5 mass in mg = distance in km * minimum plausible mg/km.
+        return MIN_PM25_MG_PER_KM / 1000
+    return 1.0
 
-def astar_pathfinding(G, start_node, end_node, weight='length'):
+# Per-graph CSR snapshot (dense node ids, adjacency, coordinates) used by A*.
+_GRAPH_CSR = weakref.WeakKeyDictionary()
+
+def graph_csr(G):
+    """Return the cached CSR snapshot of G, building it on first use."""
+    csr = _GRAPH_CSR.get(G)
+    if csr is None:
+        csr = _GRAPH_CSR[G] = build_csr(G)
+    return csr
+
+# Weights resolved into CSR cost arrays when the snapshot is built.
+ROUTE_WEIGHTS = ('time', 'pollution', 'length')
+
+def build_csr(G):
+    """Flatten G into CSR arrays, keeping the key-0 edge of each node pair."""
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    weights = G.graph.get('edge_weights')
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int32)
+    nbrs = []
+    edge_data = []
+    eids = []
+    lengths = []
+    for i, node in enumerate(nodes):
+        for neighbor, keyed in G.adj[node].items():
+            data = keyed[0]
+            nbrs.append(index[neighbor])
+            edge_data.append(data)
+            lengths.append(data.get('length', 100))
+            if weights is not None:
+                eids.append(data['eid'])
+        indptr[i + 1] = len(nbrs)
+
+    csr = {
+        'nodes': nodes,
+        'index': index,
+        'indptr': indptr,
+        'nbrs': np.array(nbrs, dtype=np.int64),
+        'edge_data': edge_data,
+        'eids': np.array(eids, dtype=np.int64) if weights is not None else None,
+        'lat': np.array([G.nodes[node]['y'] for node in nodes], dtype=np.float64),
+        'lon': np.array([G.nodes[node]['x'] for node in nodes], dtype=np.float64),
+        'costs': {'length': np.array(lengths, dtype=np.float64)},
+    }
+    # Resolve each routing weight to one contiguous array now so searches only index it.
+    for weight in ROUTE_WEIGHTS:
+        csr_edge_costs(G, csr, weight)
+    # Sorted (source * n + target) keys and their slots, for looking up the edges of a path
+    n = len(nodes)
+    keys = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr)) * n + csr['nbrs']
+    csr['pair_slots'] = np.argsort(keys)
+    csr['pair_keys'] = keys[csr['pair_slots']]
+    return csr
+
+def csr_edge_costs(G, csr, weight):
+    """Return `weight` for every CSR edge slot, falling back to the edge length (100 m if missing)."""
+    costs = csr['costs'].get(weight)
+    if costs is None:
+        weights = G.graph.get('edge_weights')
+        if weights is not None and weight in weights:
+            costs = weights[weight][csr['eids']].astype(np.float64)
+        else:
+            costs = np.array(
+                [data.get(weight, length) for data, length in zip(csr['edge_data'], csr['costs']['length'].tolist())],
+                dtype=np.float64,
+            )
+        csr['costs'][weight] = costs
+    return costs
+
+def csr_lists(G, csr, weight):
+    """Plain-list mirrors of the CSR arrays for the pure-Python search; list indexing
+    avoids boxing a NumPy scalar on every access."""
+    lists = csr.get('lists')
+    if lists is None:
+        lists = csr['lists'] = {
+            'indptr': csr['indptr'].tolist(),
+            'nbrs': csr['nbrs'].tolist(),
+            'lat': csr['lat'].tolist(),
+            'lon': csr['lon'].tolist(),
+            'costs': {},
+        }
+    if weight not in lists['costs']:
+        lists['costs'][weight] = csr_edge_costs(G, csr, weight).tolist()
+    return lists
+
+def astar_csr_python(indptr, nbrs, costs, lat, lon, start, end, h_scale, track):
+    """Same search as astar_csr, over lists, for when numba is not installed."""
+    n = len(lat)
+    g = [math.inf] * n
+    came_from = [-1] * n
+    closed = bytearray(n)
+    h = [-1.0] * n
+    explored = []
+    edge_src = []
+    edge_dst = []
+    end_lat = lat[end]
+    end_lon = lon[end]
+    meters_per_lon_degree = METERS_PER_DEGREE * math.cos(math.radians(end_lat))
+
+    g[start] = 0.0
+    # A binary heap is kept on purpose: road-network frontiers stay small, and an exact
+    # bucket-of-heaps queue measured within +/-10% of heapq here for time and PM2.5 costs.
+    open_set = [(0.0, start)]
+    while open_set:
+        _, current = heappop(open_set)
+        if closed[current]:
+            continue
+        current_g = g[current]
+
+        if track:
+            explored.append(current)
+        if current == end:
+            return current_g, came_from, explored, edge_src, edge_dst
+        closed[current] = 1
+
+        for k in range(indptr[current], indptr[current + 1]):
+            neighbor = nbrs[k]
+            if closed[neighbor]:
+                continue
+            tentative_g = current_g + costs[k]
+            if tentative_g < g[neighbor]:
+                came_from[neighbor] = current
+                g[neighbor] = tentative_g
+                if track:
+                    edge_src.append(current)
+                    edge_dst.append(neighbor)
+                h_score = h[neighbor]
+                if h_score < 0.0:
+                    dy = (lat[neighbor] - end_lat) * METERS_PER_DEGREE
+                    dx = (lon[neighbor] - end_lon) * meters_per_lon_degree
+                    h_score = h[neighbor] = math.sqrt(dx * dx + dy * dy) * h_scale
+                heappush(open_set, (tentative_g + h_score, neighbor))
+
+    return math.inf, came_from, explored, edge_src, edge_dst
+
+if njit is not None:
+    @njit(cache=True, nogil=True)
+    def astar_csr(indptr, nbrs, costs, lat, lon, start, end, h_scale, track):
+        """Compiled A* over CSR arrays; returns (cost, came_from, explored, edge_src, edge_dst)."""
+        n = lat.size
+        g = np.full(n, np.inf)
+        came_from = np.full(n, -1, dtype=np.int32)
+        closed = np.zeros(n, dtype=np.bool_)
+        h = np.full(n, -1.0)  # heuristic per node, computed on first relaxation
+        explored = np.empty(n if track else 0, dtype=np.int32)
+        edge_src = np.empty(nbrs.size if track else 0, dtype=np.int32)
+        edge_dst = np.empty(nbrs.size if track else 0, dtype=np.int32)
+        explored_count = 0
+        edge_count = 0
+        end_lat = lat[end]
+        end_lon = lon[end]
+        # Equirectangular distance to the goal; at city scale it is within a fraction of a
+        # percent of haversine and needs no trig per relaxation.
+        meters_per_lon_degree = METERS_PER_DEGREE * math.cos(math.radians(end_lat))
+
+        g[start] = 0.0
+        # Entries are (f, node): g is read back from g[] on the first pop of a node, when
+        # it still equals the pushed value, so ties fall through to the dense node id.
+        open_set = [(0.0, start)]
+        while len(open_set) > 0:
+            _, current = heappop(open_set)
+            if closed[current]:
+                continue
+            current_g = g[current]
+
+            if track:
+                explored[explored_count] = current
+                explored_count += 1
+            # The goal test stays on expansion: the first g generated for the goal is not
+            # always final, and returning then gave routes up to 2% costlier on this network.
+            if current == end:
+                return current_g, came_from, explored[:explored_count], edge_src[:edge_count], edge_dst[:edge_count]
+            closed[current] = True
+
+            for k in range(indptr[current], indptr[current + 1]):
+                neighbor = nbrs[k]
+                if closed[neighbor]:
+                    continue
+                tentative_g = current_g + costs[k]
+                # Lazy decrease-key: push only on improvement; the superseded entry is
+                # skipped by the closed check when it is popped.
+                if tentative_g < g[neighbor]:
+                    came_from[neighbor] = current
+                    g[neighbor] = tentative_g
+                    if track:
+                        edge_src[edge_count] = current
+                        edge_dst[edge_count] = neighbor
+                        edge_count += 1
+                    h_score = h[neighbor]
+                    if h_score < 0.0:
+                        dy = (lat[neighbor] - end_lat) * METERS_PER_DEGREE
+                        dx = (lon[neighbor] - end_lon) * meters_per_lon_degree
+                        h_score = h[neighbor] = math.sqrt(dx * dx + dy * dy) * h_scale
+                    heappush(open_set, (tentative_g + h_score, neighbor))
+
+        return np.inf, came_from, explored[:explored_count], edge_src[:edge_count], edge_dst[:edge_count]
+else:
+    astar_csr = None
+
+def astar_pathfinding(G, start_node, end_node, weight='length', track_exploration=True):
     """
     A* pathfinding algorithm
     weight: 'time' (fastest) or 'pollution' (greenest)
-    Returns: path, total_cost, explored_nodes
+    track_exploration: record explored nodes/edges for visualization; both stay empty when False
+    Returns: path, total_cost, explored_nodes, explored_edges
     """
+    csr = graph_csr(G)
+    nodes = csr['nodes']
+    start = csr['index'][start_node]
+    end = csr['index'][end_node]
+    h_scale = heuristic_scale(weight)
+    if astar_csr is not None:
+        cost, came_from, explored, edge_src, edge_dst = astar_csr(
+            csr['indptr'], csr['nbrs'], csr_edge_costs(G, csr, weight), csr['lat'], csr['lon'],
+            start, end, h_scale, track_exploration,
+        )
+        explored, edge_src, edge_dst = explored.tolist(), edge_src.tolist(), edge_dst.tolist()
+    else:
+        lists = csr_lists(G, csr, weight)
+        cost, came_from, explored, edge_src, edge_dst = astar_csr_python(
+            lists['indptr'], lists['nbrs'], lists['costs'][weight], lists['lat'], lists['lon'],
+            start, end, h_scale, track_exploration,
+        )
 
-    # Get coordinates for heuristic
-    end_node_data = G.nodes[end_node]
-    end_coords = (end_node_data['y'], end_node_data['x'])
-    
-    # Priority queue: (f_score, g_score, node)
-    # Note: We removed 'path' from the tuple to save RAM
-    open_set = [(0, 0, start_node)]
-    
-    # Track where we came from (to reconstruct path later)
-    came_from = {}
-    
-    # Cost to get to node
-    g_scores = {start_node: 0}
-    
-    explored_nodes = []  # For visualization
-    explored_edges = []
-    closed_set = set()   # Faster lookups than list
+    explored_nodes = [nodes[i] for i in explored]
+    explored_edges = [(nodes[u], nodes[v]) for u, v in zip(edge_src, edge_dst)]
+    if cost == math.inf:
+        return None, float('inf'), explored_nodes, explored_edges
 
-    MAX_SPEED_MPS = 80 / 3.6  # 80 km/h converted to meters/second (~22.2)
-    MIN_PM25_MG_PER_KM = 6 * 1.8  # motorway base factor * traffic multiplier
+    path = []
+    curr = end
+    while curr != -1:
+        path.append(nodes[curr])
+        curr = came_from[curr]
+    path.reverse()
+    return path, float(cost), explored_nodes, explored_edges
 
-    while open_set:
-        # Get the node with lowest F score
-        f_score, current_g, current = heappop(open_set)
-        
-        if current in closed_set:
+def reverse_csr(G, csr, weight):
+    """Transpose of the CSR adjacency (predecessor lists) with `weight` in reverse slot order."""
+    rev = csr.get('reverse')
+    if rev is None:
+        n = len(csr['nodes'])
+        sources = np.repeat(np.arange(n, dtype=np.int64), np.diff(csr['indptr']))
+        slots = np.argsort(csr['nbrs'], kind='stable')
+        indptr = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(csr['nbrs'], minlength=n), out=indptr[1:])
+        rev = csr['reverse'] = {'indptr': indptr, 'nbrs': sources[slots], 'slots': slots, 'costs': {}}
+    if weight not in rev['costs']:
+        rev['costs'][weight] = csr_edge_costs(G, csr, weight)[rev['slots']]
+    return rev
+
+def bidirectional_search(indptr, nbrs, costs, rindptr, rnbrs, rcosts, lat, lon, start, end, h_scale, track,
+                         g_f, g_r, parent_f, parent_r, closed_f, closed_r, potential, touched,
+                         explored, edge_src, edge_dst):
+    """Bidirectional A* with average potentials p(v) = (h_end(v) - h_start(v)) / 2.
+
+    Forward keys are g_f + p and reverse keys g_r - p, which makes both sides Dijkstra on
+    the same reduced costs, so the search can stop once the two top keys sum to mu.
+    Works unchanged on arrays (compiled) or lists (plain Python); the caller allocates
+    the per-node and output buffers. Every node given a potential is written to `touched`.
+    Returns (mu, meeting node, explored count, edge count, touched count).
+    """
+    start_lat = lat[start]
+    start_lon = lon[start]
+    end_lat = lat[end]
+    end_lon = lon[end]
+    start_lon_m = METERS_PER_DEGREE * math.cos(math.radians(start_lat))
+    end_lon_m = METERS_PER_DEGREE * math.cos(math.radians(end_lat))
+    half_scale = h_scale / 2
+    touched_count = 0
+
+    for node in (start, end):
+        if potential[node] != math.inf:
             continue
-            
-        # Add to animation list
-        explored_nodes.append(current)
-        
-        # --- GOAL REACHED? ---
-        if current == end_node:
-            # Reconstruct path backwards from came_from
-            path = []
-            curr = end_node
-            while curr in came_from:
-                path.append(curr)
-                curr = came_from[curr]
-            path.append(start_node)
-            path.reverse() # Flip it to be Start -> End
-            
-            return path, current_g, explored_nodes, explored_edges
-        
-        closed_set.add(current)
-        
-        # Explore neighbors
-        for neighbor in G.neighbors(current):
-            if neighbor in closed_set:
+        touched[touched_count] = node
+        touched_count += 1
+        dy = (lat[node] - end_lat) * METERS_PER_DEGREE
+        dx = (lon[node] - end_lon) * end_lon_m
+        to_end = math.sqrt(dx * dx + dy * dy)
+        dy = (lat[node] - start_lat) * METERS_PER_DEGREE
+        dx = (lon[node] - start_lon) * start_lon_m
+        potential[node] = (to_end - math.sqrt(dx * dx + dy * dy)) * half_scale
+
+    mu = math.inf
+    meet = -1
+    if start == end:
+        mu = 0.0
+        meet = start
+    g_f[start] = 0.0
+    g_r[end] = 0.0
+    open_f = [(potential[start], start)]
+    open_r = [(-potential[end], end)]
+    explored_count = 0
+    edge_count = 0
+
+    while len(open_f) > 0 and len(open_r) > 0:
+        if open_f[0][0] + open_r[0][0] >= mu:
+            break
+
+        forward = len(open_f) <= len(open_r)
+        if forward:
+            _, current = heappop(open_f)
+            if closed_f[current]:
                 continue
-            
-            # Get edge data (handle MultiDiGraph structure)
-            # We use the first edge (key=0) usually available
-            edge_data = G[current][neighbor][0]
-            
-            # --- 2. RETRIEVE CORRECT COST ---
-            # Defaults to 'length' (100m) if key is missing to prevent crash
-            edge_cost = edge_data.get(weight, edge_data.get('length', 100))
-            
-            tentative_g = current_g + edge_cost
-            
-            # If this path is better than any previous one
-            if neighbor not in g_scores or tentative_g < g_scores[neighbor]:
-                came_from[neighbor] = current
-                g_scores[neighbor] = tentative_g
-                explored_edges.append((current, neighbor))
-                # --- HEURISTIC CALCULATION ---
-                neighbor_data = G.nodes[neighbor]
-                h_dist = haversine_distance(
-                    neighbor_data['y'], neighbor_data['x'],
-                    end_coords[0], end_coords[1]
-                )
-                
-                # Scale heuristic based on goal type
-                if weight == 'time':
-                    # Time = Distance / MaxSpeed
-                    h_score = h_dist / MAX_SPEED_MPS
-                elif weight == 'pollution':
-                    # PM2.5 mass in mg = distance in km * minimum plausible mg/km.
-                    h_score = (h_dist / 1000) * MIN_PM25_MG_PER_KM
-                else:
-                    h_score = h_dist
-
-                final_f = tentative_g + h_score
-                heappush(open_set, (final_f, tentative_g, neighbor))
-    
-    # If no path found
-    return None, float('inf'), explored_nodes, explored_edges
+            current_g = g_f[current]
+            closed_f[current] = 1
+        else:
+            _, current = heappop(open_r)
+            if closed_r[current]:
+                continue
+            current_g = g_r[current]
+            closed_r[current] = 1
+        if track:
+            explored[explored_count] = current
+            explored_count += 1
+
+        if forward:
+            first, last = indptr[current], indptr[current + 1]
+        else:
+            first, last = rindptr[current], rindptr[current + 1]
+        for k in range(first, last):
+            if forward:
+                neighbor = nbrs[k]
+                if closed_f[neighbor]:
+                    continue
+                tentative_g = current_g + costs[k]
+                if tentative_g >= g_f[neighbor]:
+                    continue
+                g_f[neighbor] = tentative_g
+                parent_f[neighbor] = current
+                if track:
+                    edge_src[edge_count] = current
+                    edge_dst[edge_count] = neighbor
+            else:
+                neighbor = rnbrs[k]
+                if closed_r[neighbor]:
+                    continue
+                tentative_g = current_g + rcosts[k]
+                if tentative_g >= g_r[neighbor]:
+                    continue
+                g_r[neighbor] = tentative_g
+                parent_r[neighbor] = current
+                if track:
+                    edge_src[edge_count] = neighbor
+                    edge_dst[edge_count] = current
+            if track:
+                edge_count += 1
+
+            if potential[neighbor] == math.inf:
+                touched[touched_count] = neighbor
+                touched_count += 1
+                dy = (lat[neighbor] - end_lat) * METERS_PER_DEGREE
+                dx = (lon[neighbor] - end_lon) * end_lon_m
+                to_end = math.sqrt(dx * dx + dy * dy)
+                dy = (lat[neighbor] - start_lat) * METERS_PER_DEGREE
+                dx = (lon[neighbor] - start_lon) * start_lon_m
+                potential[neighbor] = (to_end - math.sqrt(dx * dx + dy * dy)) * half_scale
+
+            through = g_f[neighbor] + g_r[neighbor]
+            if through < mu:
+                mu = through
+                meet = neighbor
+            if forward:
+                heappush(open_f, (tentative_g + potential[neighbor], neighbor))
+            else:
+                heappush(open_r, (tentative_g - potential[neighbor], neighbor))
+
+    return mu, meet, explored_count, edge_count, touched_count
+
+if njit is not None:
+    bidirectional_search_nb = njit(cache=True, nogil=True)(bidirectional_search)
+else:
+    bidirectional_search_nb = None
+
+class _AStarScratch:
+    """Per-node buffers for bidirectional_astar, reused across searches on one graph.
+
+    reset() restores only the nodes the last search touched, so back-to-back queries
+    skip allocating and filling seven n-sized buffers. One scratch per thread.
+    """
+
+    def __init__(self, n):
+        self.compiled = bidirectional_search_nb is not None
+        if self.compiled:
+            self.buffers = (
+                np.full(n, np.inf), np.full(n, np.inf),
+                np.full(n, -1, dtype=np.int32), np.full(n, -1, dtype=np.int32),
+                np.zeros(n, dtype=np.bool_), np.zeros(n, dtype=np.bool_), np.full(n, np.inf),
+            )
+            self.touched = np.empty(n, dtype=np.int32)
+        else:
+            self.buffers = ([math.inf] * n, [math.inf] * n, [-1] * n, [-1] * n, bytearray(n), bytearray(n), [math.inf] * n)
+            self.touched = [0] * n
+
+    def reset(self, touched_count):
+        g_f, g_r, parent_f, parent_r, closed_f, closed_r, potential = self.buffers
+        touched = self.touched[:touched_count]
+        if self.compiled:
+            g_f[touched] = g_r[touched] = potential[touched] = np.inf
+            parent_f[touched] = parent_r[touched] = -1
+            closed_f[touched] = closed_r[touched] = False
+        else:
+            for node in touched:
+                g_f[node] = g_r[node] = potential[node] = math.inf
+                parent_f[node] = parent_r[node] = -1
+                closed_f[node] = closed_r[node] = 0
+
+def bidirectional_astar(G, start_node, end_node, weight='length', track_exploration=True, scratch=None):
+    """
+    Bidirectional A* from both ends; same results and return values as astar_pathfinding.
+    explored_nodes interleaves the forward and backward frontiers.
+    scratch: an _AStarScratch for this graph to reuse across calls; fresh buffers when None
+    """
+    csr = graph_csr(G)
+    rev = reverse_csr(G, csr, weight)
+    nodes = csr['nodes']
+    n = len(nodes)
+    m = len(csr['edge_data'])
+    start = csr['index'][start_node]
+    end = csr['index'][end_node]
+    # Output buffers are only sized for a full trace when it is being recorded
+    max_explored = 2 * n if track_exploration else 0
+    max_edges = 2 * m if track_exploration else 0
+
+    reuse = scratch is not None
+    if not reuse:
+        scratch = _AStarScratch(n)
+
+    if scratch.compiled:
+        search = bidirectional_search_nb
+        graph_arrays = (
+            csr['indptr'], csr['nbrs'], csr_edge_costs(G, csr, weight),
+            rev['indptr'], rev['nbrs'], rev['costs'][weight], csr['lat'], csr['lon'],
+        )
+        outputs = (
+            np.empty(max_explored, dtype=np.int32), np.empty(max_edges, dtype=np.int32), np.empty(max_edges, dtype=np.int32),
+        )
+    else:
+        search = bidirectional_search
+        lists = csr_lists(G, csr, weight)
+        rev_lists = rev.get('lists')
+        if rev_lists is None:
+            rev_lists = rev['lists'] = {'indptr': rev['indptr'].tolist(), 'nbrs': rev['nbrs'].tolist(), 'costs': {}}
+        if weight not in rev_lists['costs']:
+            rev_lists['costs'][weight] = rev['costs'][weight].tolist()
+        graph_arrays = (
+            lists['indptr'], lists['nbrs'], lists['costs'][weight],
+            rev_lists['indptr'], rev_lists['nbrs'], rev_lists['costs'][weight], lists['lat'], lists['lon'],
+        )
+        outputs = ([0] * max_explored, [0] * max_edges, [0] * max_edges)
+
+    g_f, g_r, parent_f, parent_r = scratch.buffers[:4]
+    mu, meet, explored_count, edge_count, touched_count = search(
+        *graph_arrays, start, end, heuristic_scale(weight), track_exploration,
+        *scratch.buffers, scratch.touched, *outputs
+    )
+
+    explored = outputs[0][:explored_count]
+    edge_src = outputs[1][:edge_count]
+    edge_dst = outputs[2][:edge_count]
+    if scratch.compiled:
+        explored, edge_src, edge_dst = explored.tolist(), edge_src.tolist(), edge_dst.tolist()
+    explored_nodes = [nodes[i] for i in explored]
+    explored_edges = [(nodes[u], nodes[v]) for u, v in zip(edge_src, edge_dst)]
+    path = None
+    if meet != -1:
+        path = []
+        curr = meet
+        while curr != -1:
+            path.append(nodes[curr])
+            curr = parent_f[curr]
+        path.reverse()
+        curr = parent_r[meet]
+        while curr != -1:
+            path.append(nodes[curr])
+            curr = parent_r[curr]
+    if reuse:
+        scratch.reset(touched_count)
+    if path is None:
+        return None, float('inf'), explored_nodes, explored_edges
+    return path, float(mu), explored_nodes, explored_edges
+
+def csr_path_slots(csr, path):
+    """CSR edge slots of the key-0 edges along `path`, looked up for all hops at once."""
+    n = len(csr['nodes'])
+    pair_keys = csr['pair_keys']
+    indices = np.fromiter((csr['index'][node] for node in path), dtype=np.int64, count=len(path))
+    keys = indices[:-1] * n + indices[1:]
+    positions = np.searchsorted(pair_keys, keys)
+    # A hop that is not an edge fails like G[u][v] would instead of matching a neighbour
+    found = positions < pair_keys.size
+    found[found] = pair_keys[positions[found]] == keys[found]
+    if not found.all():
+        hop = int(np.argmin(found))
+        raise KeyError((path[hop], path[hop + 1]))
+    return csr['pair_slots'][positions]
 
 def calculate_route_stats(G, path, route_name="Route"):
     """Calculate detailed statistics for a route"""
@@ -121,21 +625,44 @@ def calculate_route_stats(G, path, route_name="Route"):
     total_pollution = 0
     total_pm10 = 0
     road_types = {}
+    weights = G.graph.get('edge_weights')
+    road_codes = G.graph.get('edge_road_codes')
+    road_type_names = G.graph.get('road_types')
     
-    for i in range(len(path) - 1):
-        edge_data = G[path[i]][path[i+1]][0]
-        
-        distance = edge_data.get('length', 0)
-        time = edge_data.get('time', 0)
-        pm25 = edge_data.get('pm25_mg', edge_data.get('pollution', 0))
-        pm10 = edge_data.get('pm10_mg', pm25 * 2.5)
-        road_type = edge_data.get('road_type', 'unknown')
-        
-        total_distance += distance
-        total_time += time
-        total_pollution += pm25
-        total_pm10 += pm10
-        road_types[road_type] = road_types.get(road_type, 0) + 1
+    if weights is not None and road_codes is not None:
+        # Array-backed graphs: gather every hop's edge id and reduce each column once
+        csr = graph_csr(G)
+        slots = csr_path_slots(csr, path)
+        eids = csr['eids'][slots]
+        total_distance = float(csr['costs']['length'][slots].sum())
+        total_time = float(weights['time'][eids].sum(dtype=np.float64))
+        total_pollution = float(weights['pm25_mg'][eids].sum(dtype=np.float64))
+        total_pm10 = float(weights['pm10_mg'][eids].sum(dtype=np.float64))
+        # Road types keep the order they first appear along the route
+        codes, first, counts = np.unique(road_codes[eids], return_index=True, return_counts=True)
+        for i in np.argsort(first).tolist():
+            road_types[road_type_names[codes[i]]] = int(counts[i])
+    else:
+        for i in range(len(path) - 1):
+            edge_data = G[path[i]][path[i+1]][0]
+            
+            distance = edge_data.get('length', 0)
+            if weights is None:
+                time = edge_data.get('time', 0)
+                pm25 = edge_data.get('pm25_mg', edge_data.get('pollution', 0))
+                pm10 = edge_data.get('pm10_mg', pm25 * 2.5)
+            else:
+                eid = edge_data['eid']
+                time = float(weights['time'][eid])
+                pm25 = float(weights['pm25_mg'][eid])
+                pm10 = float(weights['pm10_mg'][eid])
+            road_type = edge_data.get('road_type', 'unknown')
+            
+            total_distance += distance
+            total_time += time
+            total_pollution += pm25
+            total_pm10 += pm10
+            road_types[road_type] = road_types.get(road_type, 0) + 1
     
     return {
         'name': route_name,
@@ -153,9 +680,11 @@ def calculate_route_stats(G, path, route_name="Route"):
 def export_routes_json(G, time_route, pollution_route, time_stats, pollution_stats, 
                        time_explored, pollution_explored, filename='routes_data.json'):
     """Export routes and exploration data for visualization"""
+    csr = graph_csr(G)
     
     def path_to_coords(path):
-        return [[G.nodes[node]['y'], G.nodes[node]['x']] for node in path]
+        indices = np.fromiter((csr['index'][node] for node in path), dtype=np.int64, count=len(path))
+        return np.column_stack((csr['lat'][indices], csr['lon'][indices]))
     
     data = {
         'time_route': {
@@ -170,44 +699,123 @@ def export_routes_json(G, time_route, pollution_route, time_stats, pollution_sta
         }
     }
     
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2)
+    # Compact output: the explored lists run to tens of thousands of points
+    if orjson is not None:
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        with open(filename, 'w') as f:
+            json.dump(data, f, separators=(',', ':'), default=lambda value: value.tolist())
     
     print(f"\n\tRoutes exported to: {filename}")
 
+# Straight-line distance window for meaningful demo routes: 2-5 km apart
+SAMPLE_ROUTE_RANGE_M = (2000, 5000)
+
+def haversine_distances(csr, starts, ends):
+    """haversine_distance between arrays of CSR node indices"""
+    # Radians and cos(lat) are computed once per node and reused by every later batch
+    trig = csr.get('trig')
+    if trig is None:
+        lat_rad = np.radians(csr['lat'])
+        trig = csr['trig'] = {'lat': lat_rad, 'lon': np.radians(csr['lon']), 'cos_lat': np.cos(lat_rad)}
+    dphi = trig['lat'][ends] - trig['lat'][starts]
+    dlambda = trig['lon'][ends] - trig['lon'][starts]
+
+    a = np.sin(dphi/2)**2 + trig['cos_lat'][starts] * trig['cos_lat'][ends] * np.sin(dlambda/2)**2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+def sample_pairs(G, count, distance_range_m=SAMPLE_ROUTE_RANGE_M, rng=None):
+    """Draw `count` random node pairs and keep those whose straight-line distance is in range."""
+    csr = graph_csr(G)
+    rng = rng or np.random.default_rng()
+    n = len(csr['nodes'])
+    starts = rng.integers(0, n, count)
+    # Offsetting by 1..n-1 keeps every pair distinct and uniform over ordered pairs
+    ends = (starts + rng.integers(1, max(n, 2), count)) % n
+
+    if distance_range_m is not None:
+        distance = haversine_distances(csr, starts, ends)
+        in_range = (distance > distance_range_m[0]) & (distance < distance_range_m[1])
+        starts, ends = starts[in_range], ends[in_range]
+
+    nodes = csr['nodes']
+    return [(nodes[u], nodes[v]) for u, v in zip(starts.tolist(), ends.tolist())]
+
 def find_sample_route(G):
     """Find two random but meaningful points for demonstration"""
-    import random
-    
-    nodes = list(G.nodes())
-    
-    # Try to find nodes that are reasonably far apart
-    max_attempts = 50
-    for _ in range(max_attempts):
-        start = random.choice(nodes)
-        end = random.choice(nodes)
-        
-        start_coords = (G.nodes[start]['y'], G.nodes[start]['x'])
-        end_coords = (G.nodes[end]['y'], G.nodes[end]['x'])
-        
-        distance = haversine_distance(start_coords[0], start_coords[1],
-                                      end_coords[0], end_coords[1])
-        
-        # Look for routes between 2-5 km apart
-        if 2000 < distance < 5000:
-            return start, end
+    # Screen a batch of random pairs at once for ones reasonably far apart
+    pairs = sample_pairs(G, 1024)
+    if pairs:
+        return pairs[0]
     
     # Fallback: just return any two different nodes
+    nodes = graph_csr(G)['nodes']
     return nodes[0], nodes[-1]
 
-def hunt_for_best_scenario(G, duration_seconds=30):
+# Pairs per task in hunt_for_best_scenario; small enough that the last batches end soon after the deadline.
+HUNT_BATCH_SIZE = 16
+HUNT_STATS_CACHE_SIZE = 4096
+_HUNT_GRAPH = None
+_HUNT_SCRATCH = None
+
+def _set_hunt_graph(G):
+    global _HUNT_GRAPH, _HUNT_SCRATCH
+    _HUNT_GRAPH = G
+    # Each worker routes its pairs one after another, so one scratch serves every search
+    _HUNT_SCRATCH = _AStarScratch(len(graph_csr(G)['nodes']))
+    hunt_route_stats.cache_clear()
+
+@lru_cache(maxsize=HUNT_STATS_CACHE_SIZE)
+def hunt_route_stats(path):
+    """calculate_route_stats on the hunt graph, memoized by path tuple"""
+    return calculate_route_stats(_HUNT_GRAPH, path)
+
+def score_pairs(pairs):
+    """Route each (u, v) both ways; returns (u, v, pollution saving %, extra minutes) per routable pair."""
+    G = _HUNT_GRAPH
+    results = []
+    for u, v in pairs:
+        time_path, time_cost, _, _ = bidirectional_astar(
+            G, u, v, weight='time', track_exploration=False, scratch=_HUNT_SCRATCH
+        )
+        poll_path, poll_cost, _, _ = bidirectional_astar(
+            G, u, v, weight='pollution', track_exploration=False, scratch=_HUNT_SCRATCH
+        )
+
+        if time_cost == float('inf') or poll_cost == float('inf') or not time_path or not poll_path:
+            continue
+        
+        # Both routes often come out identical, so the second lookup is usually a cache hit
+        fast_stats = hunt_route_stats(tuple(time_path))
+        green_stats = hunt_route_stats(tuple(poll_path))
+        
+        poll_diff = fast_stats['pollution_score'] - green_stats['pollution_score']
+        if fast_stats['pollution_score'] > 0:
+            saving_pct = (poll_diff / fast_stats['pollution_score']) * 100
+        else:
+            saving_pct = 0
+            
+        time_diff = green_stats['time_minutes'] - fast_stats['time_minutes']
+        results.append((u, v, saving_pct, time_diff))
+    return results
+
+def hunt_for_best_scenario(G, duration_seconds=30, workers=None, distance_range_m=SAMPLE_ROUTE_RANGE_M):
     import time
-    import random
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
     
     print(f"\n\tHunting for the best trade-off scenario for {duration_seconds}s...")
     
     start_time = time.time()
-    nodes = list(G.nodes())
+    rng = np.random.default_rng()
+    workers = workers or os.cpu_count() or 1
+    # Build the CSR snapshot and both reverse cost arrays up front so forked workers inherit
+    # them instead of each rebuilding them; a trivial search also readies the list mirrors
+    # (pure-Python mode) or the compiled kernel.
+    first_node = graph_csr(G)['nodes'][0]
+    for weight in ('time', 'pollution'):
+        reverse_csr(G, graph_csr(G), weight)
+        bidirectional_astar(G, first_node, first_node, weight=weight, track_exploration=False)
     
     # Track the champions
     best_pollution_saving_pct = 0
@@ -217,41 +825,45 @@ def hunt_for_best_scenario(G, duration_seconds=30):
     best_pair_loss = None
     
     attempts = 0
-    
-    while time.time() - start_time < duration_seconds:
-        attempts += 1
-        
-        u = random.choice(nodes)
-        v = random.choice(nodes)
-        
-        time_path, time_cost, _, _ = astar_pathfinding(G, u, v, weight='time')
-        poll_path, poll_cost, _, _ = astar_pathfinding(G, u, v, weight='pollution')
 
-        if time_cost == float('inf') or poll_cost == float('inf') or not time_path or not poll_path:
-            continue
+    # Candidates are screened by straight-line distance in bulk before any A* is spent on them
+    candidates = []
+    # A pair scores the same every time, so each one is only routed once per hunt
+    submitted = set()
 
-        if not time_path or not poll_path: continue
-        
-        fast_stats = calculate_route_stats(G, time_path)
-        green_stats = calculate_route_stats(G, poll_path)
-        
-        poll_diff = fast_stats['pollution_score'] - green_stats['pollution_score']
-        if fast_stats['pollution_score'] > 0:
-            saving_pct = (poll_diff / fast_stats['pollution_score']) * 100
-        else:
-            saving_pct = 0
-            
-        time_diff = green_stats['time_minutes'] - fast_stats['time_minutes']
-        
-        if saving_pct > best_pollution_saving_pct:
-            best_pollution_saving_pct = saving_pct
-            best_pair_saving = (u, v)
-            print(f"\tNew Pollution Record: {saving_pct:.1f}% saving! (Nodes: {u}->{v})")
-            
-        if time_diff > best_time_loss_min:
-            best_time_loss_min = time_diff
-            best_pair_loss = (u, v)
-            print(f"\tNew Time Loss Record: {time_diff:.1f} min slower")
+    def random_pairs():
+        while len(candidates) < HUNT_BATCH_SIZE:
+            pairs = sample_pairs(G, 1024, distance_range_m, rng)
+            # Graphs too small for the window fall back to unscreened pairs
+            pairs = pairs or sample_pairs(G, HUNT_BATCH_SIZE, None, rng)
+            fresh = [pair for pair in dict.fromkeys(pairs) if pair not in submitted]
+            # Repeat pairs instead of spinning once a small graph has none left
+            candidates.extend(fresh or pairs)
+        batch = candidates[:HUNT_BATCH_SIZE]
+        del candidates[:HUNT_BATCH_SIZE]
+        submitted.update(batch)
+        return batch
+    
+    # Pairs are drawn here and only scored by the workers, which receive G once at startup
+    with ProcessPoolExecutor(max_workers=workers, initializer=_set_hunt_graph, initargs=(G,)) as executor:
+        pending = {executor.submit(score_pairs, random_pairs()) for _ in range(2 * workers)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                attempts += HUNT_BATCH_SIZE
+                for u, v, saving_pct, time_diff in future.result():
+                    if saving_pct > best_pollution_saving_pct:
+                        best_pollution_saving_pct = saving_pct
+                        best_pair_saving = (u, v)
+                        print(f"\tNew Pollution Record: {saving_pct:.1f}% saving! (Nodes: {u}->{v})")
+                        
+                    if time_diff > best_time_loss_min:
+                        best_time_loss_min = time_diff
+                        best_pair_loss = (u, v)
+                        print(f"\tNew Time Loss Record: {time_diff:.1f} min slower")
+
+            if time.time() - start_time < duration_seconds:
+                pending |= {executor.submit(score_pairs, random_pairs()) for _ in done}
 
     print("\n" + "\t" + "="*40)
     print(f"\tHUNT COMPLETE ({attempts} attempts)")
@@ -270,8 +882,7 @@ if __name__ == "__main__":
     # Load processed network
     try:
         print("\n\tLoading processed network...")
-        with open(full_processed_path, 'rb') as f:
-            G = pickle.load(f)
+        G = load_processed_graph(full_processed_path)
         print(f"\tLoaded: {len(G.nodes())} nodes, {len(G.edges())} edges")
         
         # Find sample route